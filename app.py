@@ -4,9 +4,21 @@ import pandas as pd
 import numpy as np
 import os
 import io
+import csv
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Parser CSV Arrow (SIMD, multi-core) kalau tersedia; pd.read_csv sebagai fallback
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
 import plotly.express as px
 import folium
-from streamlit_folium import st_folium
+from folium.plugins import FastMarkerCluster
+import streamlit.components.v1 as components
 
 # -------------------------
 # CONFIG
@@ -50,41 +62,116 @@ SCHEMAS = {
     "keuangan.csv": ["ID Blok","Biaya Produksi (Rp)","Pemasukan (Rp)","Laba Bersih (Rp)"]
 }
 
+# Kolom kardinalitas kecil -> category (value_counts/isin/groupby jauh lebih cepat)
+CATEGORICAL_COLS = {
+    "blok.csv": ["Kesuburan","Status Tanam"],
+    "panen.csv": ["Grade"],
+    "tanaman.csv": ["Jenis Jagung","Varietas"],
+}
+
+# Kolom numerik diparse langsung di tokenizer C read_csv, bukan loop to_numeric setelahnya
+NUMERIC_COLS = {
+    "blok.csv": ["pH","Luas (ha)","Latitude","Longitude","Kelembapan (%)"],
+    "panen.csv": ["Hasil Panen (kg)","Harga Jual (Rp/kg)"],
+    "keuangan.csv": ["Biaya Produksi (Rp)","Pemasukan (Rp)","Laba Bersih (Rp)"],
+}
+
+# Kolom tanggal di-parse sekali saat load, bukan tiap render
+DATE_COLS = {
+    "tanaman.csv": ["Tanggal Tanam"],
+    "pupuk.csv": ["Tanggal Pemakaian"],
+    "panen.csv": ["Tanggal Panen"],
+}
+
 # -------------------------
 # HELPERS: IO & CACHE
 # -------------------------
 def csv_path(name): return os.path.join(DATA_DIR, name)
 
-@st.cache_data
-def load_data_cached(file_name):
-    path = csv_path(file_name)
-    if not os.path.exists(path):
-        if file_name in SCHEMAS:
-            pd.DataFrame(columns=SCHEMAS[file_name]).to_csv(path, index=False)
-        else:
-            pd.DataFrame().to_csv(path, index=False)
+def parquet_path(name): return os.path.join(DATA_DIR, os.path.splitext(name)[0] + ".parquet")
+
+def data_path(name):
+    """Pilih file yang akan dibaca: Parquet sibling jika ada dan tidak lebih lama dari CSV-nya."""
+    pq, cs = parquet_path(name), csv_path(name)
+    if os.path.exists(pq) and (not os.path.exists(cs) or os.path.getmtime(pq) >= os.path.getmtime(cs)):
+        return pq
+    return cs
+
+@st.cache_data(show_spinner=False)
+def load_data_cached(file_name, mtime):
+    # mtime masuk ke cache key: hanya file yang berubah yang di-parse ulang
+    path = data_path(file_name)
     try:
-        df = pd.read_csv(path)
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path, engine="pyarrow")
+        elif pacsv is not None:
+            convert = pacsv.ConvertOptions(
+                column_types={c: pa.float64() for c in NUMERIC_COLS.get(file_name, [])},
+                null_values=["", "-"],
+                strings_can_be_null=True,
+            )
+            df = pacsv.read_csv(
+                path,
+                read_options=pacsv.ReadOptions(block_size=1 << 20),
+                convert_options=convert,
+            ).to_pandas()
+        else:
+            df = pd.read_csv(path,
+                             dtype={c: "float64" for c in NUMERIC_COLS.get(file_name, [])},
+                             na_values=["", "-"])
     except Exception:
-        df = pd.DataFrame()
+        try:
+            df = pd.read_csv(path)
+        except Exception:
+            df = pd.DataFrame()
+    for c in NUMERIC_COLS.get(file_name, []):
+        if c in df.columns and not pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    for c in DATE_COLS.get(file_name, []):
+        if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    # Samakan schema sekali di sini; caller tidak perlu align_to_schema lagi
+    if file_name in SCHEMAS:
+        df = align_to_schema(df, SCHEMAS[file_name])
     return df
 
-def load_data(file_name):
-    return load_data_cached(file_name)
+def as_categorical(df, file_name):
+    """Cast kolom kardinalitas kecil ke category untuk jalur baca (dashboard/peta).
 
-def clear_load_cache():
-    load_data_cached.clear()
+    Jangan dipakai untuk frame yang masuk st.data_editor: kolom category
+    dirender sebagai selectbox yang terkunci ke kategori yang sudah ada,
+    sehingga user tidak bisa mengisi nilai baru.
+    """
+    for c in CATEGORICAL_COLS.get(file_name, []):
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
+
+def load_data(file_name):
+    ensure_table(file_name)
+    path = data_path(file_name)
+    return load_data_cached(file_name, os.path.getmtime(path))
 
 def save_data(df, file_name):
-    df.to_csv(csv_path(file_name), index=False)
-    clear_load_cache()
+    # Tulis kedua format: CSV tetap jadi format pertukaran, Parquet untuk baca cepat.
+    # Tidak perlu clear cache — mtime baru otomatis membuat entri cache baru.
+    # Buffer 1 MiB + lineterminator eksplisit: jumlah syscall write turun drastis
+    # dan hasil file sama di semua OS (tanpa \r\n Windows).
+    with open(csv_path(file_name), "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+        df.to_csv(f, index=False, lineterminator="\n")
+    df.to_parquet(parquet_path(file_name), engine="pyarrow", compression="zstd")
 
 def ensure_table(file_name):
     path = csv_path(file_name)
-    if not os.path.exists(path) and file_name in SCHEMAS:
-        pd.DataFrame(columns=SCHEMAS[file_name]).to_csv(path, index=False)
-        clear_load_cache()
+    if not os.path.exists(path) and not os.path.exists(parquet_path(file_name)):
+        cols = SCHEMAS.get(file_name)
+        pd.DataFrame(columns=cols if cols else None).to_csv(path, index=False)
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def df_to_csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(max_entries=8, show_spinner=False)
 def df_to_excel_bytes(df):
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
@@ -101,6 +188,39 @@ def read_uploaded_file(uploaded):
         st.error("Gagal membaca file upload: " + str(e))
         return None
 
+# -------------------------
+# HELPERS: AGREGASI NUMERIK
+# -------------------------
+try:
+    import numba
+
+    @numba.njit(cache=True)
+    def nanmean_nansum(a):
+        """Mean dan sum (skip NaN) dalam satu pass atas array float64."""
+        total = 0.0
+        n = 0
+        for i in range(a.shape[0]):
+            x = a[i]
+            if not np.isnan(x):
+                total += x
+                n += 1
+        mean = total / n if n else np.nan
+        return mean, total
+except ImportError:
+    def nanmean_nansum(a):
+        """Fallback NumPy jika numba tidak terpasang."""
+        mask = ~np.isnan(a)
+        n = int(mask.sum())
+        total = float(a[mask].sum())
+        mean = total / n if n else float("nan")
+        return mean, total
+
+def col_mean_sum(df, col):
+    """(nanmean, nansum) satu kolom numerik; (nan, 0.0) jika kolom tak ada/kosong."""
+    if col not in df.columns or not len(df):
+        return float("nan"), 0.0
+    return nanmean_nansum(df[col].to_numpy(dtype=np.float64, copy=False))
+
 # -------------------------
 # SAFE RERUN HELPER
 # -------------------------
@@ -115,26 +235,80 @@ if "_safe_rerun" in st.session_state and st.session_state["_safe_rerun"]:
 # -------------------------
 # AUTH
 # -------------------------
+# Cookie login opsional: kalau paketnya tidak ada, alur login biasa tetap jalan
+try:
+    from streamlit_cookies_manager import CookieManager
+    _cookies = CookieManager(prefix="jagung_")
+except ImportError:
+    _cookies = None
+
+# Tanpa DASHBOARD_SECRET cookie login dimatikan total — default yang ter-hardcode
+# di source publik berarti siapa pun bisa mencetak cookie admin sendiri.
+SESSION_SECRET = os.environ.get("DASHBOARD_SECRET")
+SESSION_TTL = 7 * 24 * 3600  # cookie sesi berlaku 7 hari
+
+def session_token(username, expires):
+    return hmac.new(SESSION_SECRET.encode(), f"{username}|{expires}".encode(), "sha256").hexdigest()
+
+def remember_login(username):
+    """Simpan cookie sesi bertanda tangan HMAC supaya buka tab baru tidak perlu login ulang."""
+    if _cookies is not None and SESSION_SECRET and _cookies.ready():
+        expires = int(time.time()) + SESSION_TTL
+        _cookies["session"] = f"{username}|{expires}|{session_token(username, expires)}"
+        _cookies.save()
+
+def try_cookie_login():
+    """Isi session_state dari cookie sesi yang valid, jika ada."""
+    if _cookies is None or not SESSION_SECRET or not _cookies.ready():
+        return
+    raw = _cookies.get("session")
+    if not raw or raw.count("|") != 2:
+        return
+    username, expires, token = raw.split("|")
+    if not expires.isdigit() or int(expires) < time.time():
+        return
+    if not hmac.compare_digest(token, session_token(username, expires)):
+        return
+    try:
+        users = load_users(os.path.getmtime(USERS_FILE))
+    except Exception:
+        return
+    entry = users.get(username)
+    if entry:
+        st.session_state['logged_in'] = True
+        st.session_state['username'] = username
+        st.session_state['role'] = entry[1]
+
+@st.cache_data(show_spinner=False)
+def load_users(mtime):
+    """users.csv -> {username: (password, role)} tanpa lewat pandas."""
+    with open(USERS_FILE, newline="", encoding="utf-8") as f:
+        return {r["username"]: (r["password"], r["role"]) for r in csv.DictReader(f)}
+
 def login_page():
     st.markdown('<div class="header-gradient"><h2>🌿 Dashboard Jagung v2.0 — Login</h2></div>', unsafe_allow_html=True)
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
     if st.button("Masuk"):
         try:
-            users = pd.read_csv(USERS_FILE)
+            users = load_users(os.path.getmtime(USERS_FILE))
         except Exception:
             st.error("File users.csv tidak ditemukan atau korup.")
             return
-        match = users[(users.username==username)&(users.password==password)]
-        if not match.empty:
+        entry = users.get(username)
+        # bandingkan sebagai bytes: compare_digest menolak str non-ASCII
+        if entry and hmac.compare_digest(str(entry[0]).encode(), password.encode()):
             st.session_state['logged_in'] = True
             st.session_state['username'] = username
-            st.session_state['role'] = match.iloc[0]['role']
+            st.session_state['role'] = entry[1]
+            remember_login(username)
             st.success(f"Selamat datang, {username} ({st.session_state['role']})")
             safe_rerun()
         else:
             st.error("Username/password salah.")
 
+if 'logged_in' not in st.session_state:
+    try_cookie_login()
 if 'logged_in' not in st.session_state:
     login_page()
     st.stop()
@@ -158,18 +332,14 @@ def align_to_schema(df_up, schema):
     - Tambahkan kolom yang hilang dengan pd.NA
     - Urutkan kolom sesuai schema
     """
-    cols_map = {}
-    for c in df_up.columns:
-        for s in schema:
-            if c.strip().lower() == s.strip().lower():
-                cols_map[c] = s
-                break
+    lower = {s.strip().lower(): s for s in schema}
+    cols_map = {c: lower[c.strip().lower()] for c in df_up.columns if c.strip().lower() in lower}
     df_up = df_up.rename(columns=cols_map)
-    for s in schema:
-        if s not in df_up.columns:
-            df_up[s] = pd.NA
-    df_up = df_up[schema]
-    return df_up
+    # Header ganda (mis. "pH" dan "PH" sama-sama jadi "pH") bikin reindex gagal;
+    # pertahankan kolom pertama saja
+    df_up = df_up.loc[:, ~df_up.columns.duplicated()]
+    # reindex menambah semua kolom hilang sekaligus dan mengurutkan sesuai schema
+    return df_up.reindex(columns=schema)
 
 def upload_section(file_name, id_col=None):
     st.markdown("**Import data (CSV / XLSX)**")
@@ -184,8 +354,7 @@ def upload_section(file_name, id_col=None):
     if file_name in SCHEMAS:
         df_up = align_to_schema(df_up, SCHEMAS[file_name])
     if st.button("Proses Import", key=file_name+"_proses"):
-        existing = load_data(file_name)
-        existing = align_to_schema(existing, SCHEMAS[file_name])  # ✅ pastikan schema sama
+        existing = load_data(file_name)  # sudah selaras schema dari load_data_cached
         if mode.startswith("Replace"):
             save_data(df_up, file_name)
             st.success("Tabel diganti dengan data baru.")
@@ -193,7 +362,8 @@ def upload_section(file_name, id_col=None):
         else:
             combined = pd.concat([existing, df_up], ignore_index=True)
             if id_col and id_col in combined.columns:
-                combined = combined.drop_duplicates(subset=[id_col], keep="last")
+                # inplace: dedup tanpa materialisasi frame ketiga
+                combined.drop_duplicates(subset=[id_col], keep="last", inplace=True, ignore_index=True)
             save_data(combined, file_name)
             st.success("Data berhasil digabung (append).")
             safe_rerun()
@@ -201,8 +371,11 @@ def upload_section(file_name, id_col=None):
 def manage_table_page(title, file_name, id_col=None):
     st.markdown(f'<div class="header-gradient"><h3>{title}</h3></div>', unsafe_allow_html=True)
     ensure_table(file_name)
-    df = load_data(file_name)
-    df = align_to_schema(df, SCHEMAS[file_name])  # ✅ pastikan semua kolom schema muncul
+    df = load_data(file_name)  # sudah selaras schema dari load_data_cached
+    # Frame untuk data_editor harus bebas dtype category (mis. dari Parquet lama)
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(object)
 
     role = st.session_state.get("role", "")
 
@@ -213,8 +386,10 @@ def manage_table_page(title, file_name, id_col=None):
         if role != "Viewer":  # 🔒 Viewer tidak boleh upload
             upload_section(file_name, id_col=id_col)
         if not df.empty:
-            st.download_button("⬇️ Download CSV", df.to_csv(index=False).encode("utf-8"), file_name, mime="text/csv")
-            st.download_button("⬇️ Download Excel", df_to_excel_bytes(df), file_name.replace(".csv", ".xlsx"))
+            st.download_button("⬇️ Download CSV", df_to_csv_bytes(df), file_name, mime="text/csv")
+            # Excel baru di-serialize saat diminta, tidak di setiap rerun
+            if st.button("📦 Siapkan Excel", key=file_name + "_xlsx"):
+                st.download_button("⬇️ Download Excel", df_to_excel_bytes(df), file_name.replace(".csv", ".xlsx"))
 
     # -----------------------
     # 📋 Data Tabel
@@ -250,6 +425,100 @@ def manage_table_page(title, file_name, id_col=None):
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+def filter_options(series):
+    """Opsi filter sidebar: ["Semua"] + nilai unik terurut.
+
+    Untuk kolom category cukup baca daftar kategorinya (O(kardinalitas)),
+    tanpa pass dropna/astype/unique atas seluruh kolom.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        vals = series.cat.categories.astype(str).tolist()
+    else:
+        vals = series.dropna().astype(str).unique().tolist()
+    return ["Semua"] + sorted(vals)
+
+@st.cache_data(max_entries=8, show_spinner=False,
+               hash_funcs={pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=False).values.tobytes()})
+def build_map_html(blok_filtered):
+    """Bangun peta folium + marker sekali per isi data; rerun berikutnya pakai HTML dari cache."""
+    m = folium.Map(
+        location=[blok_filtered["Latitude"].mean(), blok_filtered["Longitude"].mean()],
+        zoom_start=15
+    )
+    folium.TileLayer('OpenStreetMap').add_to(m)
+    folium.TileLayer('Esri.WorldImagery', name='Satelit').add_to(m)
+    folium.LayerControl().add_to(m)
+
+    # Popup dirakit vektor per kolom, lalu semua marker dikirim sebagai satu payload JSON
+    status = blok_filtered["Status Tanam"].astype(str) if "Status Tanam" in blok_filtered.columns else "-"
+    kesub = blok_filtered["Kesuburan"].astype(str) if "Kesuburan" in blok_filtered.columns else "-"
+    popups = ("ID: " + blok_filtered["ID Blok"].astype(str)
+              + "<br>Luas: " + blok_filtered["Luas (ha)"].astype(str) + " ha"
+              + "<br>Status: " + status
+              + "<br>Kesuburan: " + kesub).to_numpy()
+    callback = """
+    function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]));
+        marker.bindPopup(row[2]);
+        return marker;
+    };
+    """
+    # column_stack + tolist merakit [lat, lon, popup] per baris di level C
+    data = np.column_stack([
+        blok_filtered[["Latitude", "Longitude"]].to_numpy(dtype=object),
+        popups,
+    ]).tolist()
+    FastMarkerCluster(data=data, callback=callback).add_to(m)
+
+    return m.get_root().render()
+
+# -------------------------
+# GRAFIK DASHBOARD (fragment: hanya rerun bagian grafiknya sendiri)
+# -------------------------
+@st.fragment
+def chart_kesuburan(blok):
+    fig_pie = px.pie(
+        blok,
+        names="Kesuburan",
+        title="Distribusi Kesuburan Tanah",
+        color_discrete_sequence=px.colors.sequential.Greens
+    )
+    st.plotly_chart(fig_pie, use_container_width=True)
+
+@st.fragment
+def chart_status_tanam(blok):
+    status_count = blok["Status Tanam"].value_counts().reset_index()
+    status_count.columns = ["Status", "Jumlah Blok"]
+    fig_status = px.bar(
+        status_count, x="Status", y="Jumlah Blok",
+        color="Jumlah Blok", color_continuous_scale="Greens",
+        title="Jumlah Blok per Status Tanam"
+    )
+    st.plotly_chart(fig_status, use_container_width=True)
+
+@st.fragment
+def chart_tren_panen(panen):
+    # resample di DatetimeIndex: agregasi bulanan lewat integer ns, bukan groupby string
+    panen_bulanan = (panen.dropna(subset=["Tanggal Panen"])
+                     .set_index("Tanggal Panen")
+                     .resample("MS")["Hasil Panen (kg)"].sum()
+                     .reset_index())
+    panen_bulanan["Bulan"] = panen_bulanan["Tanggal Panen"].dt.strftime("%Y-%m")
+    fig_line = px.line(
+        panen_bulanan, x="Bulan", y="Hasil Panen (kg)", markers=True,
+        title="Tren Hasil Panen Bulanan", color_discrete_sequence=["#0b7a3f"]
+    )
+    st.plotly_chart(fig_line, use_container_width=True)
+
+@st.fragment
+def chart_laba_blok(keu):
+    fig_profit = px.bar(
+        keu, x="ID Blok", y=["Pemasukan (Rp)", "Biaya Produksi (Rp)", "Laba Bersih (Rp)"],
+        barmode="group", title="Perbandingan Pemasukan, Biaya, dan Laba per Blok",
+        color_discrete_sequence=["#a3e4a2", "#0b7a3f", "#ffa500"]
+    )
+    st.plotly_chart(fig_profit, use_container_width=True)
+
 
 # -------------------------
 # DASHBOARD UTAMA
@@ -259,26 +528,13 @@ if menu == "🏠 Dashboard":
     st.markdown("<h1 style='color:#0b7a3f'>🌾 Dashboard Jagung - SmartFarm H.Imis</h1>", unsafe_allow_html=True)
     st.caption("📊 Dashboard berbasis data CSV — dibuat oleh Yori Destrama")
 
-    # Load data dari CSV
-    blok = load_data("blok.csv")
-    panen = load_data("panen.csv")
-    keu = load_data("keuangan.csv")
-    tanaman = load_data("tanaman.csv")
-    pupuk = load_data("pupuk.csv")
-    tenaga = load_data("tenaga_kerja.csv")
-
-# -------------------------
-    # KONVERSI NUMERIK (penting supaya .mean() & .sum() tidak nan)
-    # -------------------------
-    for col in ["pH","Luas (ha)"]:
-        if col in blok.columns:
-            blok[col] = pd.to_numeric(blok[col], errors='coerce')
-    for col in ["Hasil Panen (kg)"]:
-        if col in panen.columns:
-            panen[col] = pd.to_numeric(panen[col], errors='coerce')
-    for col in ["Laba Bersih (Rp)"]:
-        if col in keu.columns:
-            keu[col] = pd.to_numeric(keu[col], errors='coerce')
+    # Load enam tabel paralel — GIL lepas di parser C, jadi I/O+parse benar-benar overlap.
+    # Saat cache sudah hangat, map hanya mengembalikan entri cache.
+    with ThreadPoolExecutor(max_workers=6) as ex:
+        blok, panen, keu, tanaman, pupuk, tenaga = ex.map(
+            load_data,
+            ["blok.csv", "panen.csv", "keuangan.csv", "tanaman.csv", "pupuk.csv", "tenaga_kerja.csv"]
+        )
 
     # -------------------------
     # CEK DATA & Fallback
@@ -297,10 +553,10 @@ if menu == "🏠 Dashboard":
     # METRIK UTAMA
     # -------------------------
     total_blok = len(blok)
-    avg_ph = round(blok["pH"].mean(), 2) if "pH" in blok.columns else "-"
-    total_panen = int(panen["Hasil Panen (kg)"].sum()) if not panen.empty and "Hasil Panen (kg)" in panen.columns else 0
-    total_laba = int(keu["Laba Bersih (Rp)"].sum()) if not keu.empty and "Laba Bersih (Rp)" in keu.columns else 0
-    avg_luas = round(blok["Luas (ha)"].mean(), 2) if "Luas (ha)" in blok.columns else "-"
+    avg_ph = round(col_mean_sum(blok, "pH")[0], 2) if "pH" in blok.columns else "-"
+    total_panen = int(col_mean_sum(panen, "Hasil Panen (kg)")[1]) if not panen.empty and "Hasil Panen (kg)" in panen.columns else 0
+    total_laba = int(col_mean_sum(keu, "Laba Bersih (Rp)")[1]) if not keu.empty and "Laba Bersih (Rp)" in keu.columns else 0
+    avg_luas = round(col_mean_sum(blok, "Luas (ha)")[0], 2) if "Luas (ha)" in blok.columns else "-"
     total_jenis_tanaman = tanaman["Jenis Jagung"].nunique() if not tanaman.empty else 0
     total_pekerja = len(tenaga) if not tenaga.empty else 0
 
@@ -315,74 +571,60 @@ if menu == "🏠 Dashboard":
 
     st.divider()
 
+    # Salinan ber-dtype category khusus grafik; blok asli tetap object
+    # karena turun ke df_summary dan st.data_editor di bawah
+    blok_cat = as_categorical(blok.copy(), "blok.csv")
+
     # -------------------------
     # DISTRIBUSI KESUBURAN
     # -------------------------
     if "Kesuburan" in blok.columns and not blok.empty:
-        fig_pie = px.pie(
-            blok, 
-            names="Kesuburan", 
-            title="Distribusi Kesuburan Tanah", 
-            color_discrete_sequence=px.colors.sequential.Greens
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        chart_kesuburan(blok_cat)
 
     # -------------------------
     # STATUS TANAM
     # -------------------------
     if "Status Tanam" in blok.columns and not blok.empty:
-        status_count = blok["Status Tanam"].value_counts().reset_index()
-        status_count.columns = ["Status", "Jumlah Blok"]
-        fig_status = px.bar(
-            status_count, x="Status", y="Jumlah Blok", 
-            color="Jumlah Blok", color_continuous_scale="Greens", 
-            title="Jumlah Blok per Status Tanam"
-        )
-        st.plotly_chart(fig_status, use_container_width=True)
+        chart_status_tanam(blok_cat)
 
     # -------------------------
     # TREND PANEN BULANAN
     # -------------------------
     if not panen.empty and "Tanggal Panen" in panen.columns and "Hasil Panen (kg)" in panen.columns:
-        panen["Tanggal Panen"] = pd.to_datetime(panen["Tanggal Panen"], errors='coerce')
-        panen["Bulan"] = panen["Tanggal Panen"].dt.to_period("M").astype(str)
-        panen_bulanan = panen.groupby("Bulan")["Hasil Panen (kg)"].sum().reset_index()
-        fig_line = px.line(
-            panen_bulanan, x="Bulan", y="Hasil Panen (kg)", markers=True,
-            title="Tren Hasil Panen Bulanan", color_discrete_sequence=["#0b7a3f"]
-        )
-        st.plotly_chart(fig_line, use_container_width=True)
+        chart_tren_panen(panen)
 
     # -------------------------
     # LABA PER BLOK
     # -------------------------
     if not keu.empty and all(col in keu.columns for col in ["ID Blok", "Pemasukan (Rp)", "Biaya Produksi (Rp)", "Laba Bersih (Rp)"]):
-        fig_profit = px.bar(
-            keu, x="ID Blok", y=["Pemasukan (Rp)", "Biaya Produksi (Rp)", "Laba Bersih (Rp)"],
-            barmode="group", title="Perbandingan Pemasukan, Biaya, dan Laba per Blok",
-            color_discrete_sequence=["#a3e4a2", "#0b7a3f", "#ffa500"]
-        )
-        st.plotly_chart(fig_profit, use_container_width=True)
+        chart_laba_blok(keu)
 
     # -------------------------
     # RINGKASAN TABEL
     # -------------------------
     st.markdown("### 📋 Ringkasan Blok + Panen + Keuangan")
-    df_summary = blok[["ID Blok","Luas (ha)","pH","Kesuburan","Status Tanam"]].copy()
     if not panen.empty and "Hasil Panen (kg)" in panen.columns:
-        panen_sum = panen.groupby("ID Blok")["Hasil Panen (kg)"].sum().reset_index()
+        panen_sum = panen.groupby("ID Blok", sort=False, observed=True)["Hasil Panen (kg)"].sum()
     else:
-        panen_sum = pd.DataFrame(columns=["ID Blok","Hasil Panen (kg)"])
+        panen_sum = pd.Series(dtype="float64", name="Hasil Panen (kg)")
     if not keu.empty and "Laba Bersih (Rp)" in keu.columns:
-        keu_sum = keu.groupby("ID Blok")["Laba Bersih (Rp)"].sum().reset_index()
+        keu_sum = keu.groupby("ID Blok", sort=False, observed=True)["Laba Bersih (Rp)"].sum()
     else:
-        keu_sum = pd.DataFrame(columns=["ID Blok","Laba Bersih (Rp)"])
-    df_summary = df_summary.merge(panen_sum, on="ID Blok", how="left")
-    df_summary = df_summary.merge(keu_sum, on="ID Blok", how="left")
-    df_summary.fillna(0, inplace=True)
+        keu_sum = pd.Series(dtype="float64", name="Laba Bersih (Rp)")
+    # join lewat index (alignment) — tanpa hash-join dan tanpa reset_index antara
+    df_summary = (blok.set_index("ID Blok")[["Luas (ha)","pH","Kesuburan","Status Tanam"]]
+                  .join([panen_sum, keu_sum])
+                  .reset_index())
+    # fillna hanya kolom numerik — kolom category tidak menerima nilai di luar kategorinya
+    for c in ["Luas (ha)","pH","Hasil Panen (kg)","Laba Bersih (Rp)"]:
+        df_summary[c] = df_summary[c].fillna(0)
 
     # Tampilkan data editor
-    edited_summary = st.data_editor(df_summary, num_rows="dynamic", use_container_width=True)
+    # Key diturunkan dari isi frame: selama data tidak berubah Streamlit memakai
+    # state grid yang sama (tidak remount), dan saat data berubah editor di-reset bersih.
+    fp = int(pd.util.hash_pandas_object(df_summary, index=False).sum())
+    edited_summary = st.data_editor(df_summary, num_rows="dynamic", use_container_width=True,
+                                    key=f"summary_editor_{fp}")
 
     # Simpan perubahan
     if st.button("💾 Simpan Ringkasan (Update Data Asli)"):
@@ -452,7 +694,8 @@ elif menu == "🗺️ Peta Blok Lahan":
 
     if map_type == "🗺️ Geo Map (Marker)":
         # ------------------- kode Geo Map lama -------------------
-        blok = load_data("blok.csv")
+        # halaman peta read-only, aman pakai dtype category untuk filter
+        blok = as_categorical(load_data("blok.csv"), "blok.csv")
 
         # Jika data kosong, buat dummy
         if blok.empty:
@@ -472,16 +715,26 @@ elif menu == "🗺️ Peta Blok Lahan":
             ])
 
         # Sidebar filter
-        statuses = ["Semua"] + sorted(blok["Status Tanam"].dropna().astype(str).unique().tolist()) if "Status Tanam" in blok.columns else ["Semua"]
-        kesub = ["Semua"] + sorted(blok["Kesuburan"].dropna().astype(str).unique().tolist()) if "Kesuburan" in blok.columns else ["Semua"]
+        statuses = filter_options(blok["Status Tanam"]) if "Status Tanam" in blok.columns else ["Semua"]
+        kesub = filter_options(blok["Kesuburan"]) if "Kesuburan" in blok.columns else ["Semua"]
         sel_status = st.sidebar.selectbox("Status Tanam", statuses, key="map_status")
         sel_kesub = st.sidebar.selectbox("Kesuburan", kesub, key="map_kesub")
 
-        # Pastikan Latitude dan Longitude ada
-        if ("Latitude" not in blok.columns) or ("Longitude" not in blok.columns) or blok["Latitude"].isna().any() or blok["Longitude"].isna().any():
+        # Pastikan Latitude dan Longitude ada; isi dummy HANYA untuk sel yang kosong,
+        # koordinat asli tidak boleh tertimpa
+        for c in ("Latitude", "Longitude"):
+            if c not in blok.columns:
+                blok[c] = np.nan
+        missing = blok["Latitude"].isna() | blok["Longitude"].isna()
+        if missing.any():
             center_lat, center_lon = -3.316, 114.602
-            blok["Latitude"] = center_lat + (np.random.rand(len(blok)) - 0.5) * 0.02
-            blok["Longitude"] = center_lon + (np.random.rand(len(blok)) - 0.5) * 0.02
+            # Offset deterministik dari hash ID Blok: rerun demi rerun menghasilkan
+            # koordinat dummy yang sama, jadi cache HTML peta tetap bisa kena
+            h = pd.util.hash_pandas_object(
+                blok.loc[missing, "ID Blok"].astype(str), index=False
+            ).to_numpy()
+            blok.loc[missing, "Latitude"] = center_lat + ((h % 1_000_000) / 1_000_000 - 0.5) * 0.02
+            blok.loc[missing, "Longitude"] = center_lon + ((h // 1_000_000 % 1_000_000) / 1_000_000 - 0.5) * 0.02
 
         # Filter data
         blok_filtered = blok.copy()
@@ -494,28 +747,8 @@ elif menu == "🗺️ Peta Blok Lahan":
         if blok_filtered.empty:
             st.warning("Data blok tidak ditemukan untuk filter ini.")
         else:
-            # Map
-            m = folium.Map(
-                location=[blok_filtered["Latitude"].mean(), blok_filtered["Longitude"].mean()],
-                zoom_start=15
-            )
-            folium.TileLayer('OpenStreetMap').add_to(m)
-            folium.TileLayer('Esri.WorldImagery', name='Satelit').add_to(m)
-            folium.LayerControl().add_to(m)
-
-            # Marker
-            for _, row in blok_filtered.iterrows():
-                folium.Marker(
-                    location=[row["Latitude"], row["Longitude"]],
-                    popup=(
-                        f"ID: {row['ID Blok']}<br>"
-                        f"Luas: {row['Luas (ha)']} ha<br>"
-                        f"Status: {row.get('Status Tanam','-')}<br>"
-                        f"Kesuburan: {row.get('Kesuburan','-')}"
-                    )
-                ).add_to(m)
-
-            st_folium(m, width=1024, height=600)
+            # HTML peta dari cache; interaksi klik tidak dipakai, jadi cukup components.html
+            components.html(build_map_html(blok_filtered), width=1024, height=600)
 
     else:
         # ================= PETA OFFLINE =================